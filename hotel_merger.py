@@ -1,11 +1,32 @@
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from dataclasses import dataclass
-import json
+from itertools import chain
+from operator import itemgetter
+from typing import Iterable
 import argparse
+import os
+import sqlite3
+import tempfile
+import time
 
-import requests
+import orjson
+import requests_cache
 
+# Supplier catalogs change slowly, cache responses on disk and revalidate
+# them with ETag / Last-Modified once they expire
+session = requests_cache.CachedSession(
+    "hotels_cache", backend="sqlite", cache_control=True, expire_after=3600
+)
 
-@dataclass
+# Merged hotels are persisted here and reused until they are older than the TTL,
+# set HOTELS_DB to keep the store outside the working directory
+HOTELS_DB = os.environ.get("HOTELS_DB", "hotels.db")
+HOTELS_DB_TTL = 3600
+
+
+@dataclass(slots=True)
 class Location:
     lat: float
     lng: float
@@ -14,26 +35,26 @@ class Location:
     country: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Amenities:
     general: list[str]
     room: list[str]
 
 
-@dataclass
+@dataclass(slots=True)
 class Image:
     link: str
     description: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Images:
     rooms: list[Image]
     site: list[Image]
     amenities: list[Image]
 
 
-@dataclass
+@dataclass(slots=True)
 class Hotel:
     id: str
     destination_id: str
@@ -46,16 +67,43 @@ class Hotel:
 
 
 class BaseSupplier:
+    @staticmethod
     def endpoint():
         """URL to fetch supplier data"""
 
+    @staticmethod
     def parse(obj: dict) -> Hotel:
         """Parse supplier-provided data into Hotel object"""
 
-    def fetch(self):
-        url = self.endpoint()
-        resp = requests.get(url)
-        return [self.parse(dto) for dto in resp.json()]
+    @classmethod
+    def fetch(cls):
+        """Download supplier data and lazily parse it one hotel at a time"""
+        url = cls.endpoint()
+        resp = session.get(url)
+        return cls._parse_releasing(resp.json())
+
+    @classmethod
+    def _parse_releasing(cls, dtos: list[dict]):
+        # Pop each DTO as it is parsed so the decoded payload shrinks while
+        # the merged hotels grow, instead of both being held at once
+        dtos.reverse()
+        while dtos:
+            yield cls.parse(dtos.pop())
+
+
+# Extract every field a supplier DTO needs in a single C-level call
+_ACME_FIELDS = itemgetter(
+    "Id",
+    "DestinationId",
+    "Name",
+    "Description",
+    "Latitude",
+    "Longitude",
+    "Address",
+    "City",
+    "Country",
+    "Facilities",
+)
 
 
 class Acme(BaseSupplier):
@@ -65,20 +113,32 @@ class Acme(BaseSupplier):
 
     @staticmethod
     def parse(dto: dict) -> Hotel:
+        (
+            id_,
+            destination_id,
+            name,
+            description,
+            lat,
+            lng,
+            address,
+            city,
+            country,
+            facilities,
+        ) = _ACME_FIELDS(dto)
         return Hotel(
-            id=dto["Id"],
-            destination_id=dto["DestinationId"],
-            name=dto["Name"],
-            description=dto["Description"],
+            id=id_,
+            destination_id=destination_id,
+            name=name,
+            description=description,
             location=Location(
-                lat=dto["Latitude"],
-                lng=dto["Longitude"],
-                address=dto["Address"],
-                city=dto["City"],
-                country=dto["Country"],
+                lat=lat,
+                lng=lng,
+                address=address,
+                city=city,
+                country=country,
             ),
             amenities=Amenities(
-                general=dto["Facilities"],
+                general=facilities,
                 room=[],
             ),
             images=Images(
@@ -90,6 +150,11 @@ class Acme(BaseSupplier):
         )
 
 
+_PATAGONIA_FIELDS = itemgetter(
+    "id", "destination", "name", "info", "lat", "lng", "address", "amenities", "images"
+)
+
+
 class Patagonia(BaseSupplier):
     @staticmethod
     def endpoint():
@@ -97,20 +162,31 @@ class Patagonia(BaseSupplier):
 
     @staticmethod
     def parse(dto: dict) -> Hotel:
+        (
+            id_,
+            destination_id,
+            name,
+            description,
+            lat,
+            lng,
+            address,
+            amenities,
+            images,
+        ) = _PATAGONIA_FIELDS(dto)
         return Hotel(
-            id=dto["id"],
-            destination_id=dto["destination"],
-            name=dto["name"],
-            description=dto["info"],
+            id=id_,
+            destination_id=destination_id,
+            name=name,
+            description=description,
             location=Location(
-                lat=dto["lat"],
-                lng=dto["lng"],
-                address=dto["address"],
+                lat=lat,
+                lng=lng,
+                address=address,
                 city="",
                 country="",
             ),
             amenities=Amenities(
-                room=dto["amenities"],
+                room=amenities,
                 general=[],
             ),
             images=Images(
@@ -120,20 +196,32 @@ class Patagonia(BaseSupplier):
                         link=room["url"],
                         description=room["description"],
                     )
-                    for room in dto["images"]["rooms"]
+                    for room in images["rooms"]
                 ],
                 amenities=[
                     Image(
                         link=amenity["url"],
                         description=amenity["description"],
                     )
-                    for amenity in dto["images"]["amenities"]
+                    for amenity in images["amenities"]
                 ],
             ),
             booking_conditions=[],
         )
 
 
+_PAPERFLIES_FIELDS = itemgetter(
+    "hotel_id",
+    "destination_id",
+    "hotel_name",
+    "details",
+    "location",
+    "amenities",
+    "images",
+    "booking_conditions",
+)
+
+
 class Paperflies(BaseSupplier):
     @staticmethod
     def endpoint():
@@ -141,21 +229,31 @@ class Paperflies(BaseSupplier):
 
     @staticmethod
     def parse(dto: dict) -> Hotel:
+        (
+            id_,
+            destination_id,
+            name,
+            description,
+            location,
+            amenities,
+            images,
+            booking_conditions,
+        ) = _PAPERFLIES_FIELDS(dto)
         return Hotel(
-            id=dto["hotel_id"],
-            destination_id=dto["destination_id"],
-            name=dto["hotel_name"],
-            description=dto["details"],
+            id=id_,
+            destination_id=destination_id,
+            name=name,
+            description=description,
             location=Location(
                 lat="",
                 lng="",
                 city="",
-                address=dto["location"]["address"],
-                country=dto["location"]["country"],
+                address=location["address"],
+                country=location["country"],
             ),
             amenities=Amenities(
-                general=dto["amenities"]["general"],
-                room=dto["amenities"]["room"],
+                general=amenities["general"],
+                room=amenities["room"],
             ),
             images=Images(
                 rooms=[
@@ -163,118 +261,215 @@ class Paperflies(BaseSupplier):
                         link=room["link"],
                         description=room["caption"],
                     )
-                    for room in dto["images"]["rooms"]
+                    for room in images["rooms"]
                 ],
                 site=[
                     Image(
                         link=site["link"],
                         description=site["caption"],
                     )
-                    for site in dto["images"]["site"]
+                    for site in images["site"]
                 ],
                 amenities=[],  # No amenities images in Paperflies data
             ),
-            booking_conditions=dto["booking_conditions"],
+            booking_conditions=booking_conditions,
         )
 
 
 class HotelsService:
     def __init__(self):
         self.data = []
+        self._merged_hotels: dict[str, Hotel] = {}
 
-    def merge_value(self, value1, value2):
-        """Helper function to merge two values based on conditions."""
-        if value1 is None and value2 is None:
-            return None
-        elif value1 is None:
-            return value2
-        elif value2 is None:
+    def _merge_str(self, value1, value2):
+        """Keep the longer of two strings, ignoring missing ones."""
+        if not value2:
             return value1
-        else:
-            return value1 if len(str(value1)) >= len(str(value2)) else value2
-
-    def merge_and_save(self, hotels: list[Hotel]):
-        merged_hotels: dict[str, Hotel] = {}
-
-        for hotel in hotels:
-            key = (hotel.id, hotel.destination_id)
-
-            if key not in merged_hotels:
-                merged_hotels[key] = hotel
-            else:
-                existing = merged_hotels[key]
-
-                # Merge name and description
-                existing.name = self.merge_value(existing.name, hotel.name)
-                existing.description = self.merge_value(
-                    existing.description, hotel.description
-                )
+        if not value1:
+            return value2
+        return value1 if len(value1) >= len(value2) else value2
 
-                # Merge location fields
-                existing.location.lat = self.merge_value(
-                    existing.location.lat, hotel.location.lat
-                )
-                existing.location.lng = self.merge_value(
-                    existing.location.lng, hotel.location.lng
-                )
-                existing.location.address = self.merge_value(
-                    existing.location.address, hotel.location.address
-                )
-                existing.location.city = self.merge_value(
-                    existing.location.city, hotel.location.city
-                )
-                existing.location.country = self.merge_value(
-                    existing.location.country, hotel.location.country
-                )
+    def _merge_list(self, value1, value2):
+        """Keep the longer of two lists, ignoring missing ones."""
+        if not value2:
+            return value1
+        if not value1:
+            return value2
+        return value1 if len(value1) >= len(value2) else value2
+
+    def _merge_amenities(self, value1, value2):
+        """Union two amenity lists, deduplicated case-insensitively."""
+        merged = {}
+        for amenity in (value1 or []) + (value2 or []):
+            merged.setdefault(amenity.strip().lower(), amenity)
+        return list(merged.values())
+
+    def _merge_images(self, value1, value2):
+        """Union two image lists, deduplicated by link."""
+        merged = {}
+        for image in (value1 or []) + (value2 or []):
+            merged.setdefault(image.link, image)
+        return list(merged.values())
+
+    def _merge_scalar(self, value1, value2):
+        """Keep the first present scalar value, 0.0 counts as present."""
+        return value2 if value1 is None or value1 == "" else value1
 
-                # Merge amenities
-                existing.amenities.general = self.merge_value(
-                    existing.amenities.general, hotel.amenities.general
-                )
-                existing.amenities.room = self.merge_value(
-                    existing.amenities.room, hotel.amenities.room
-                )
+    @staticmethod
+    def _key(hotel_id, destination_id) -> str:
+        """Composite lookup key, the unit separator keeps it unambiguous."""
+        return f"{hotel_id}\x1f{destination_id}"
 
-                # Merge images
-                existing.images.rooms = self.merge_value(
-                    existing.images.rooms, hotel.images.rooms
-                )
-                existing.images.site = self.merge_value(
-                    existing.images.site, hotel.images.site
-                )
-                existing.images.amenities = self.merge_value(
-                    existing.images.amenities, hotel.images.amenities
-                )
+    def ingest(self, hotel: Hotel):
+        """Merge a single supplier hotel into the in-memory store."""
+        key = self._key(hotel.id, hotel.destination_id)
 
-                # Merge booking conditions
-                existing.booking_conditions = self.merge_value(
-                    existing.booking_conditions, hotel.booking_conditions
-                )
+        if key not in self._merged_hotels:
+            self._merged_hotels[key] = hotel
+        else:
+            existing = self._merged_hotels[key]
+
+            # Merge name and description
+            existing.name = self._merge_str(existing.name, hotel.name)
+            existing.description = self._merge_str(
+                existing.description, hotel.description
+            )
+
+            # Merge location fields
+            existing.location.lat = self._merge_scalar(
+                existing.location.lat, hotel.location.lat
+            )
+            existing.location.lng = self._merge_scalar(
+                existing.location.lng, hotel.location.lng
+            )
+            existing.location.address = self._merge_str(
+                existing.location.address, hotel.location.address
+            )
+            existing.location.city = self._merge_str(
+                existing.location.city, hotel.location.city
+            )
+            existing.location.country = self._merge_str(
+                existing.location.country, hotel.location.country
+            )
+
+            # Merge amenities
+            existing.amenities.general = self._merge_amenities(
+                existing.amenities.general, hotel.amenities.general
+            )
+            existing.amenities.room = self._merge_amenities(
+                existing.amenities.room, hotel.amenities.room
+            )
+
+            # Merge images
+            existing.images.rooms = self._merge_images(
+                existing.images.rooms, hotel.images.rooms
+            )
+            existing.images.site = self._merge_images(
+                existing.images.site, hotel.images.site
+            )
+            existing.images.amenities = self._merge_images(
+                existing.images.amenities, hotel.images.amenities
+            )
+
+            # Merge booking conditions
+            existing.booking_conditions = self._merge_list(
+                existing.booking_conditions, hotel.booking_conditions
+            )
+
+    def merge_and_save(self, hotels: Iterable[Hotel]):
+        # Each call merges a fresh batch, only ingest accumulates
+        self._merged_hotels = {}
+        for hotel in hotels:
+            self.ingest(hotel)
 
-        self.data = list(merged_hotels.values())
+        self.data = list(self._merged_hotels.values())
 
     def find(self, hotel_ids, destination_ids):
         # return list of hotel objects such that hotels.hotel_id == hotel_ids[i] and hotels.destination_id == destination_ids[i]
-        # cast destination_ids as a list of str
-        hotel_ids = [] if hotel_ids == "none" else hotel_ids.split(",")
-        destination_ids = (
-            [] if destination_ids == "none" else destination_ids.split(",")
-        )
-        # print(hotel_ids, destination_ids)
-        if (len(hotel_ids) == 0) or (len(destination_ids) == 0):
+        pairs = _parse_query(hotel_ids, destination_ids)
+        if pairs is None:
             return self.data
 
+        # Look each (hotel_id, destination_id) pair up in the merge index
         result = []
-        for i in range(len(hotel_ids)):
-            hotel_ids[i] = hotel_ids[i].strip()
-            destination_ids[i] = destination_ids[i].strip()
-            for hotel in self.data:
-                if (hotel.id == hotel_ids[i]) and (
-                    hotel.destination_id == destination_ids[i]
-                ):
-                    result.append(hotel)
+        for hotel_id, destination_id in pairs:
+            key = self._key(hotel_id, destination_id)
+            if key in self._merged_hotels:
+                result.append(self._merged_hotels[key])
         return result
 
+    def to_columns(self, hotels: Iterable[Hotel] | None = None) -> dict:
+        """Transpose hotels into columns for bulk, scan-style consumers.
+
+        Coordinates are packed into float arrays, missing ones become NaN.
+        """
+        hotels = self.data if hotels is None else hotels
+        columns = {
+            "id": [],
+            "destination_id": [],
+            "name": [],
+            "description": [],
+            "lat": array("d"),
+            "lng": array("d"),
+            "address": [],
+            "city": [],
+            "country": [],
+        }
+        for hotel in hotels:
+            columns["id"].append(hotel.id)
+            columns["destination_id"].append(hotel.destination_id)
+            columns["name"].append(hotel.name)
+            columns["description"].append(hotel.description)
+            columns["lat"].append(_to_float(hotel.location.lat))
+            columns["lng"].append(_to_float(hotel.location.lng))
+            columns["address"].append(hotel.location.address)
+            columns["city"].append(hotel.location.city)
+            columns["country"].append(hotel.location.country)
+        return columns
+
+    def save_to_db(self, path: str = HOTELS_DB):
+        """Persist merged hotels to SQLite, indexed on (id, destination_id).
+
+        The store is built in a temporary file and swapped into place, so
+        readers only ever see a complete snapshot. It is only a cache, failing
+        to write it is not an error.
+        """
+        rows = [
+            (
+                str(hotel.id),
+                str(hotel.destination_id),
+                orjson.dumps(custom_hotel_serializer(hotel)),
+            )
+            for hotel in self.data
+        ]
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(path) or ".", suffix=".tmp"
+            )
+            os.close(fd)
+            with closing(sqlite3.connect(tmp_path)) as conn, conn:
+                conn.execute(
+                    "CREATE TABLE hotels ("
+                    "id TEXT NOT NULL, destination_id TEXT NOT NULL, "
+                    "payload BLOB NOT NULL, PRIMARY KEY (id, destination_id))"
+                )
+                conn.execute("CREATE TABLE meta (written_at REAL NOT NULL)")
+                conn.executemany("INSERT INTO hotels VALUES (?, ?, ?)", rows)
+                conn.execute("INSERT INTO meta VALUES (?)", (time.time(),))
+            os.replace(tmp_path, path)
+        except (sqlite3.Error, OSError):
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def _to_float(value) -> float:
+    # Suppliers without coordinates report them as "" or None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
 
 def custom_hotel_serializer(hotel):
     return {
@@ -308,31 +503,84 @@ def custom_hotel_serializer(hotel):
     }
 
 
+def _parse_query(hotel_ids, destination_ids):
+    """Split CLI id arguments into stripped (hotel_id, destination_id) pairs.
+
+    Returns None when either argument is "none", meaning every hotel matches.
+    """
+    hotel_ids = [] if hotel_ids == "none" else hotel_ids.split(",")
+    destination_ids = [] if destination_ids == "none" else destination_ids.split(",")
+    if (len(hotel_ids) == 0) or (len(destination_ids) == 0):
+        return None
+    return [
+        (hotel_id.strip(), destination_id.strip())
+        for hotel_id, destination_id in zip(hotel_ids, destination_ids)
+    ]
+
+
+def find_in_db(hotel_ids, destination_ids, path: str = HOTELS_DB):
+    """Answer a query from the persisted hotels.
+
+    Returns None when the store is missing, empty, stale or unreadable, so the
+    caller falls back to the full fetch and merge pipeline.
+    """
+    if not os.path.exists(path):
+        return None
+
+    pairs = _parse_query(hotel_ids, destination_ids)
+    try:
+        with closing(sqlite3.connect(path)) as conn:
+            # Freshness comes from the committed snapshot, not the file mtime
+            meta = conn.execute("SELECT written_at FROM meta").fetchone()
+            if meta is None or time.time() - meta[0] > HOTELS_DB_TTL:
+                return None
+            if conn.execute("SELECT 1 FROM hotels LIMIT 1").fetchone() is None:
+                return None
+
+            if pairs is None:
+                query = "SELECT payload FROM hotels ORDER BY rowid"
+                rows = conn.execute(query).fetchall()
+            else:
+                query = "SELECT payload FROM hotels WHERE id = ? AND destination_id = ?"
+                rows = [row for pair in pairs for row in conn.execute(query, pair)]
+        return [orjson.loads(payload) for (payload,) in rows]
+    except (sqlite3.Error, orjson.JSONDecodeError):
+        return None
+
+
 def fetch_hotels(hotel_ids, destination_ids):
     # Write your code here
 
-    suppliers: list[BaseSupplier] = [
-        Acme(),
-        Paperflies(),
-        Patagonia(),
+    # Serve straight from the persisted store while it is fresh
+    cached = find_in_db(hotel_ids, destination_ids)
+    if cached is not None:
+        return orjson.dumps(cached, option=orjson.OPT_INDENT_2).decode()
+
+    # Suppliers are stateless, use the classes directly
+    suppliers: list[type[BaseSupplier]] = [
+        Acme,
+        Paperflies,
+        Patagonia,
     ]
 
-    # Fetch data from all suppliers
-    all_supplier_data = []
-    for supplier in suppliers:
-        supplier_hotel = supplier.fetch()
-        all_supplier_data.extend(supplier_hotel)
-        # print(supplier_hotel)
+    # Fetch data from all suppliers concurrently, requests are I/O bound
+    with ThreadPoolExecutor(max_workers=len(suppliers)) as executor:
+        supplier_hotels = executor.map(lambda supplier: supplier.fetch(), suppliers)
 
-    # Merge all the data and save it in-memory somewhere
+    # Merge hotels as they are parsed and save them in-memory, every supplier
+    # payload is already downloaded and is released DTO by DTO while merging
     svc = HotelsService()
-    svc.merge_and_save(all_supplier_data)
+    svc.merge_and_save(chain.from_iterable(supplier_hotels))
+    svc.save_to_db()
 
     # Fetch filtered data
     filtered = svc.find(hotel_ids, destination_ids)
 
     # Return as json
-    return json.dumps([custom_hotel_serializer(hotel) for hotel in filtered], indent=2)
+    return orjson.dumps(
+        [custom_hotel_serializer(hotel) for hotel in filtered],
+        option=orjson.OPT_INDENT_2,
+    ).decode()
 
 
 def main():